@@ -1,12 +1,18 @@
 # project_root/core/bot_engine.py
 
 import logging
+import re
 from .configs import bot_config
 from .module_manager import ModuleManager
+from .rate_limiter import RateLimiter
 from services.slack_service import SlackService
+from .snippets import SnippetsRunner
+from modules.snippet_manager import SNIPPET_COMMANDS, snippet_storage, discard_snippet
 
 logger = logging.getLogger(__name__)
 
+MENTION_REGEX = re.compile(r"<@\w+>")
+
 class BotEngine:
     """
     Minimal Slack event orchestrator. For snippet logic or typed commands, 
@@ -15,6 +21,8 @@ class BotEngine:
 
     def __init__(self):
         logger.info("[INIT] BotEngine: loading modules, no watchers here.")
+        self.slack_service = SlackService()
+        self.snippets_runner = SnippetsRunner()
         self.module_manager = ModuleManager()
         self.module_manager.load_modules()
 
@@ -22,150 +30,132 @@ class BotEngine:
         self.classifier_manager = self.module_manager.get_module("classification_manager")
         self.snippet_manager = self.module_manager.get_module("snippet_manager")
 
-    """
+        # request_type => flow handler; anything unknown falls back to ASKTHEWORLD.
+        # All handlers take (user_text, user_id, channel, thread_ts, role_info, extra_data).
+        self.request_handlers = {
+            "ASKTHEBOT": self._handle_askthebot,
+            "CODER": self._handle_coder_flow,
+            "ASKTHEWORLD": self._handle_asktheworld_flow,
+        }
 
+        # "<@BOTID>" as Slack writes it at the start of an app_mention
+        self.mention_token = f"<@{self.slack_service.bot_user_id}>" if self.slack_service.bot_user_id else None
 
-    logger.debug("[BOT_ENGINE] Slack event => text='%s', user='%s', ch='%s', thread_ts='%s'",
-                 user_text, user_id, channel, thread_ts)
-
-    # 1) If a snippet is pending in this thread,
-    #    let snippet_manager handle commands; ignore any other text.
-    if self.has_pending_snippet(channel, thread_ts):
-        snippet_result = self.snippet_manager.handle_typed_command(user_text, user_id, channel, thread_ts)
-        if snippet_result:
-            # If there's a snippet_result => maybe "confirm", so run snippet
-            if snippet_result.get("action") == "execute_snippet":
-                snippet_id = snippet_result["snippet_id"]
-                from modules.snippet_manager import snippet_storage
-                entry = snippet_storage.get(snippet_id, None)
-                if not entry:
-                    return  # snippet missing?
-
-                code_str = entry["code"]
-                snippet_channel = entry["channel"]
-                snippet_thread = entry["thread_ts"]
-
-                coder_mgr = self.module_manager.get_module("coder_manager")
-                snippet_callable = coder_mgr.create_snippet_callable(code_str)
-                if snippet_callable:
-                    from core.snippets import SnippetsRunner
-                    runner = SnippetsRunner()
-                    runner.run_snippet_now(snippet_callable, snippet_channel, snippet_thread)
-                    # Once done, remove snippet
-                    snippet_storage.pop(snippet_id, None)
-
-                    SlackService().post_message(
-                        channel=snippet_channel,
-                        text="Snippet executed successfully!",
-                        thread_ts=snippet_thread
-                    )
-                    logger.info("[BOT_ENGINE] Snippet executed => '%s'", entry["user_request"])
-                else:
-                    SlackService().post_message(
-                        channel=snippet_channel,
-                        text="Failed to create snippet callable.",
-                        thread_ts=snippet_thread
-                    )
-                    logger.error("[BOT_ENGINE] snippet callable creation failed => '%s'", entry["user_request"])
-            # If snippet_result is None or "cancel"/"extend", do nothing more
-        else:
-            # A snippet is pending, but user typed something that isn't confirm/cancel/extend
-            # => do nothing (skip classification)
-            pass
-
-        return  # we do NOT continue to classification if snippet is pending
-
-    # 2) If no snippet is pending in this thread => classification
-    classification = self.classifier_manager.handle_classification(user_text, user_id, channel, thread_ts)
-    ...
-    # handle normal flows (ASKTHEBOT, CODER, ASKTHEWORLD)
+        self.rate_limiter = RateLimiter(
+            capacity=bot_config.get("user_rate_limit_burst", 5),
+            refill_per_minute=bot_config.get("user_rate_limit_per_minute", 10)
+        )
 
-    """
-    
     def handle_incoming_slack_event(self, event_data):
         user_text = event_data.get("text","")
         channel  = event_data.get("channel")
         thread_ts= event_data.get("thread_ts") or event_data.get("ts")
         user_id  = event_data.get("user")
 
+        # app_mention text starts with "<@BOTID>"; strip mentions once so typed
+        # commands and classification both see what the user actually wrote.
+        stripped_text = self._strip_mentions(user_text)
+
+        # A bare mention (or an empty message) can't be a snippet command and
+        # isn't worth a rate-limit token or a classifier call.
+        if not stripped_text or not user_id:
+            logger.debug("[BOT_ENGINE] Ignoring empty event text (user='%s')", user_id)
+            return
+
         logger.debug("[BOT_ENGINE] Slack event => text='%s', user='%s', ch='%s', thread_ts='%s'",
-                     user_text, user_id, channel, thread_ts)
-
-        # 1) snippet_manager typed command
-        snippet_result = self.snippet_manager.handle_typed_command(user_text, user_id, channel, thread_ts)
-        if snippet_result:
-            # If there's a snippet_result => maybe "confirm", so run snippet
-            if snippet_result.get("action") == "execute_snippet":
-                snippet_id = snippet_result["snippet_id"]
-                from modules.snippet_manager import snippet_storage
-                entry = snippet_storage.get(snippet_id, None)
-                if not entry:
-                    return  # snippet missing?
-
-                code_str = entry["code"]
-                snippet_channel = entry["channel"]
-                snippet_thread = entry["thread_ts"]
-
-                coder_mgr = self.module_manager.get_module("coder_manager")
-                snippet_callable = coder_mgr.create_snippet_callable(code_str)
-                if snippet_callable:
-                    from core.snippets import SnippetsRunner
-                    runner = SnippetsRunner()
-                    runner.run_snippet_now(snippet_callable, snippet_channel, snippet_thread)
-                    # Once done, remove snippet
-                    snippet_storage.pop(snippet_id, None)
-
-                    SlackService().post_message(
-                        channel=snippet_channel,
-                        text="Snippet executed successfully!",
-                        thread_ts=snippet_thread
-                    )
-                    logger.info("[BOT_ENGINE] Snippet executed => '%s'", entry["user_request"])
-                else:
-                    SlackService().post_message(
-                        channel=snippet_channel,
-                        text="Failed to create snippet callable.",
-                        thread_ts=snippet_thread
-                    )
-                    logger.error("[BOT_ENGINE] snippet callable creation failed => '%s'", entry["user_request"])
-            # If snippet_result is None or "cancel"/"extend", do nothing more
-        else:
-            # A snippet is pending, but user typed something that isn't confirm/cancel/extend
-            # => do nothing (skip classification)
-            pass
-
-        return  # we do NOT continue to classification if snippet is pending
-
-        # 2) If no snippet is pending in this thread => classification
-        classification = self.classifier_manager.handle_classification(user_text, user_id, channel, thread_ts)
+                     stripped_text, user_id, channel, thread_ts)
+
+        # 1) If a snippet is pending in this thread,
+        #    let snippet_manager handle typed commands; ignore any other text.
+        if self.has_pending_snippet(channel, thread_ts):
+            snippet_result = self.snippet_manager.handle_typed_command(stripped_text, user_id, channel, thread_ts)
+            if snippet_result:
+                # If there's a snippet_result => maybe "confirm", so run snippet
+                if snippet_result.get("action") == "execute_snippet":
+                    snippet_id = snippet_result["snippet_id"]
+                    entry = snippet_storage.get(snippet_id, None)
+                    if not entry:
+                        return  # snippet missing?
+
+                    code_str = entry["code"]
+                    snippet_channel = entry["channel"]
+                    snippet_thread = entry["thread_ts"]
+
+                    coder_mgr = self.module_manager.get_module("coder_manager")
+                    snippet_callable = coder_mgr.create_snippet_callable(code_str)
+                    if snippet_callable:
+                        # Let the user know right away; the snippet may take a while and
+                        # run_snippet_now posts its output/result when it finishes.
+                        self.slack_service.post_message(
+                            channel=snippet_channel,
+                            text=f"Running snippet ID={snippet_id}. I'll post the result here when it's done.",
+                            thread_ts=snippet_thread
+                        )
+                        try:
+                            self.snippets_runner.run_snippet_now(snippet_callable, snippet_channel, snippet_thread)
+                        finally:
+                            # Once done, remove snippet
+                            discard_snippet(snippet_id)
+                            # The snippet may have changed code/config that cached
+                            # architecture answers describe.
+                            askbot = self.module_manager.get_module("askthebot_manager")
+                            if askbot:
+                                askbot.clear_cache()
+                        logger.info("[BOT_ENGINE] Snippet executed => '%s'", entry["user_request"])
+                    else:
+                        # Never started, so don't leave it "running" for the freeze watchdog
+                        discard_snippet(snippet_id)
+                        self.slack_service.post_message(
+                            channel=snippet_channel,
+                            text="Failed to create snippet callable.",
+                            thread_ts=snippet_thread
+                        )
+                        logger.error("[BOT_ENGINE] snippet callable creation failed => '%s'", entry["user_request"])
+                # If snippet_result is None or "cancel"/"extend", do nothing more
+            else:
+                # A snippet is pending, but user typed something that isn't confirm/cancel/extend
+                # => do nothing (skip classification)
+                pass
+
+            return  # we do NOT continue to classification if snippet is pending
+
+        # 2) If no snippet is pending in this thread => classification.
+        #    Everything from here on costs GPT calls, so rate-limit per user.
+        if not self.rate_limiter.allow(user_id):
+            # Reply once per window; further rejected messages are dropped silently
+            notice_seconds = bot_config.get("user_rate_limit_notice_seconds", 60)
+            if self.rate_limiter.claim_notice(user_id, notice_seconds):
+                self.slack_service.post_message(
+                    channel=channel,
+                    text=f"<@{user_id}> you're sending requests too fast. Please wait a bit and try again.",
+                    thread_ts=thread_ts
+                )
+            return
+
+        classification = self.classifier_manager.handle_classification(stripped_text, user_id, channel, thread_ts)
         req_type = classification.get("request_type","ASKTHEWORLD")
         role_info= classification.get("role_info","default")
         extra_data=classification.get("extra_data",{})
 
         logger.info("[BOT_ENGINE] classification => %s, role=%s, extra_data=%s", req_type, role_info, extra_data)
 
-        if req_type == "ASKTHEBOT":
-            self._handle_askthebot(user_text, user_id, channel, thread_ts)
-        elif req_type == "CODER":
-            self._handle_coder_flow(user_text, channel, thread_ts, role_info, extra_data)
-        else:
-            self._handle_asktheworld_flow(user_text, role_info, extra_data, channel, thread_ts)
+        handler = self.request_handlers.get(req_type, self._handle_asktheworld_flow)
+        handler(stripped_text, user_id, channel, thread_ts, role_info, extra_data)
 
-    def _handle_askthebot(self, user_text, user_id, channel, thread_ts):
+    def _handle_askthebot(self, user_text, user_id, channel, thread_ts, role_info, extra_data):
         askbot = self.module_manager.get_module("askthebot_manager")
         if not askbot:
             logger.error("[BOT_ENGINE] askthebot_manager not found.")
             return
         response = askbot.handle_bot_question(user_text, user_id, channel, thread_ts)
-        SlackService().post_message(channel=channel, text=response, thread_ts=thread_ts)
+        self.slack_service.post_message(channel=channel, text=response, thread_ts=thread_ts)
 
-    def _handle_coder_flow(self, user_text, channel, thread_ts, role_info, extra_data):
+    def _handle_coder_flow(self, user_text, user_id, channel, thread_ts, role_info, extra_data):
         """
         1) Generate snippet code with coder_manager
         2) Second pass snippet review with classification_manager
         3) snippet_manager.propose_snippet(...) => store snippet & instruct user typed commands
         """
-        from modules.coder_manager import CoderManager
         coder_mgr = self.module_manager.get_module("coder_manager")
         if not coder_mgr:
             logger.error("[BOT_ENGINE] coder_manager missing.")
@@ -189,7 +179,7 @@ class BotEngine:
             role_info=role_info
         )
 
-    def _handle_asktheworld_flow(self, user_text, role_info, extra_data, channel, thread_ts):
+    def _handle_asktheworld_flow(self, user_text, user_id, channel, thread_ts, role_info, extra_data):
         askworld = self.module_manager.get_module_by_type("ASKTHEWORLD")
         if not askworld:
             logger.error("[BOT_ENGINE] asktheworld_manager not found.")
@@ -203,11 +193,30 @@ class BotEngine:
             user_text=user_text,
             system_prompt=system_prompt,
             temperature=temperature,
-            user_id=None,
+            user_id=user_id,
             channel=channel,
             thread_ts=thread_ts
         )
 
+    def _strip_mentions(self, user_text):
+        """
+        Remove user mentions. The common shapes (no mention at all, or just the
+        bot's own mention up front) are handled with plain string checks; the
+        regex only runs when other mentions appear in the text.
+        """
+        if "<@" not in user_text:
+            return user_text.strip()
+        token = self.mention_token
+        if token and user_text.startswith(token) and "<@" not in user_text[len(token):]:
+            return user_text[len(token):].strip()
+        return MENTION_REGEX.sub("", user_text).strip()
+
+    def is_snippet_command(self, user_text):
+        """
+        Cheap check for a typed snippet command (exact 'confirm'/'cancel'/'extend').
+        """
+        return user_text.strip() in SNIPPET_COMMANDS
+
     def has_pending_snippet(self, channel, thread_ts):
         """
         Return True if snippet_manager has a snippet in this channel/thread 
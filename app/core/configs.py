@@ -241,6 +241,10 @@ Below is a comprehensive reference of the main classes, methods, and how they in
   - Class GitHubService (optional):
     - Might open PRs, commit changes, revert merges if advanced user logic requests.  
     - Tied to a GH_TOKEN with push/write scopes.
+    - get_file_contents(owner=None, repo=None, path="README.md", ref="main"): returns a file's decoded text, or None.  
+    - create_pull_request(owner=None, repo=None, head_branch="feature", base_branch="main", title="New PR", body=""): opens a PR.  
+    - commit_files(files, message, branch="main", owner=None, repo=None): commits several files at once; `files` maps repo path -> text content. Returns the new commit SHA, or None.  
+    - owner/repo default to GH_OWNER / GH_REPO_NAME. Prefer one commit_files call over committing files one by one.
 
 ================================================================================
 5) CONCURRENCY & EPHEMERAL MESSAGES
@@ -287,8 +291,22 @@ This Slackbot integrates ephemeral concurrency watchers, dynamic role management
     # Additional snippet/time config
     "snippet_expiration_minutes": 5,        # default snippet expiry
     "snippet_line_limit": 250,             # max snippet lines
+    "snippet_max_pending": 100,            # proposals awaiting confirm/cancel, across all threads
     "typed_confirmation_mode": True,       # typed commands for snippet
     "snippet_watchdog_seconds": 60,        # time until we alert no user action
     "admin_watchdog_timeout_seconds": 10800,# 3 hours
-    "force_bot_termination_on_snippet_freeze": True
+    "force_bot_termination_on_snippet_freeze": True,
+
+    # Conversation memory
+    "thread_conversation_ttl_minutes": 60, # forget Q&A threads idle this long
+    "stream_update_interval_seconds": 1.0, # min gap between chat_update edits of a streamed answer
+    "qna_history_max_tokens": 6000,        # est. prompt tokens a Q&A thread may resend before pruning
+    "qna_history_keep_messages": 6,        # newest messages kept verbatim when a thread is pruned
+
+    # GPT call tuning
+    "user_rate_limit_burst": 5,            # GPT-backed requests a user can fire back to back
+    "user_rate_limit_per_minute": 10,      # sustained GPT-backed requests per user
+    "user_rate_limit_notice_seconds": 60,  # at most one "slow down" reply per user per this many seconds
+    "classifier_history_messages": 20,     # past user/assistant messages sent with each classification
+    "askthebot_cache_size": 128            # cached answers to repeated architecture questions
 }
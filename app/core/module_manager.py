@@ -1,9 +1,12 @@
 # project_root/core/module_manager.py
 
 import os
+import logging
 import importlib
 import inspect
 
+logger = logging.getLogger(__name__)
+
 MODULES_FOLDER = os.path.join(os.path.dirname(__file__), "..", "modules")
 
 class BaseModule:
@@ -25,16 +28,15 @@ class ModuleManager:
     def _import_and_register(self, module_path):
         try:
             mod = importlib.import_module(module_path)
-            print(f"[DEBUG] Imported module: {module_path}")
-            # or logger.debug(f"Imported module: {module_path}")
+            logger.debug("[MODULE_MANAGER] Imported module: %s", module_path)
         except Exception as e:
-            print(f"[ERROR] Failed to import module {module_path}: {e}")
+            logger.error("[MODULE_MANAGER] Failed to import module %s: %s", module_path, e)
             return
 
         for name, obj in inspect.getmembers(mod, inspect.isclass):
             if issubclass(obj, BaseModule) and obj is not BaseModule:
                 instance = obj()
-                print(f"[DEBUG] Instantiating and initializing: {obj.__name__}")
+                logger.debug("[MODULE_MANAGER] Instantiating and initializing: %s", obj.__name__)
                 instance.initialize()
                 self.loaded_modules[instance.module_name] = instance
 
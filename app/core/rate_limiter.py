@@ -0,0 +1,93 @@
+# project_root/core/rate_limiter.py
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class RateLimiter:
+    """
+    Per-user token bucket. Each user gets `capacity` tokens that refill at
+    `refill_per_minute`; every GPT-backed request costs one token.
+    Refill and decrement happen under one lock, so concurrent events for the
+    same user can't both spend the last token.
+    """
+
+    def __init__(self, capacity, refill_per_minute):
+        self.capacity = float(capacity)
+        self.refill_per_second = refill_per_minute / 60.0
+        self._buckets = {}  # user_id -> (tokens, last_refill monotonic time)
+        self._last_notice = {}  # user_id -> monotonic time of the last "slow down" notice
+        self._lock = threading.Lock()
+
+    def allow(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            tokens, last_refill = self._buckets.get(user_id, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - last_refill) * self.refill_per_second)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+            self._buckets[user_id] = (tokens, now)
+
+        if not allowed:
+            logger.info("[RATE_LIMITER] user=%s over limit", user_id)
+        return allowed
+
+    def claim_notice(self, user_id, interval_seconds):
+        """
+        True at most once per interval_seconds per user, so someone flooding the
+        channel gets one "slow down" reply rather than one per rejected message.
+        """
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_notice.get(user_id)
+            if last is not None and now - last < interval_seconds:
+                return False
+            self._last_notice[user_id] = now
+            return True
+
+
+class RequestThrottle:
+    """
+    Process-wide throttle for an upstream API: `concurrency` is a semaphore
+    capping requests in flight, and wait_for_request() blocks until both the
+    requests-per-minute bucket and (if set) the tokens-per-minute bucket can
+    cover the call. Bursts of events queue here instead of hitting the API all
+    at once and coming back as 429s.
+    """
+
+    def __init__(self, max_concurrent, requests_per_minute, tokens_per_minute=0):
+        self.concurrency = threading.BoundedSemaphore(max_concurrent)
+        self.refill_per_second = requests_per_minute / 60.0
+        self.capacity = max(1.0, self.refill_per_second)  # about one second of burst
+        self._tokens = self.capacity
+        # TPM bucket holds up to a minute of budget; 0 disables it
+        self.tpm_refill_per_second = tokens_per_minute / 60.0
+        self.tpm_capacity = float(tokens_per_minute)
+        self._tpm_tokens = self.tpm_capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait_for_request(self, estimated_tokens=0):
+        # A single request bigger than the whole bucket waits for a full bucket
+        # rather than forever.
+        need_tpm = min(float(estimated_tokens), self.tpm_capacity) if self.tpm_capacity else 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                elapsed = now - self._last_refill
+                self._tokens = min(self.capacity, self._tokens + elapsed * self.refill_per_second)
+                if self.tpm_capacity:
+                    self._tpm_tokens = min(self.tpm_capacity,
+                                           self._tpm_tokens + elapsed * self.tpm_refill_per_second)
+                self._last_refill = now
+
+                if self._tokens >= 1.0 and self._tpm_tokens >= need_tpm:
+                    self._tokens -= 1.0
+                    self._tpm_tokens -= need_tpm
+                    return
+                wait = max((1.0 - self._tokens) / self.refill_per_second,
+                           (need_tpm - self._tpm_tokens) / self.tpm_refill_per_second if need_tpm else 0.0)
+            time.sleep(wait)
@@ -0,0 +1,65 @@
+# project_root/core/response_cache.py
+
+import json
+import hashlib
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """
+    Small SQLite-backed key/value store for deterministic GPT replies, so they
+    survive worker restarts. Keys are sha256 of the JSON request parameters.
+    One connection is shared across threads behind a lock; if the database
+    can't be opened the cache just stays disabled (every lookup misses).
+    """
+
+    def __init__(self, path, max_rows=5000):
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self._conn = None
+        if not path:
+            return
+        try:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT)")
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning("[RESPONSE_CACHE] disabled, can't open %s: %s", path, e)
+            self._conn = None
+
+    @staticmethod
+    def make_key(params):
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        if self._conn is None:
+            return None
+        try:
+            with self._lock:
+                row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("[RESPONSE_CACHE] read failed: %s", e)
+            return None
+        return row[0] if row else None
+
+    def put(self, key, response):
+        if self._conn is None:
+            return
+        try:
+            with self._lock:
+                self._conn.execute("INSERT OR REPLACE INTO responses (key, response) VALUES (?, ?)", (key, response))
+                self._inserts += 1
+                # Trim to the newest max_rows now and then rather than on every insert
+                if self._inserts % 100 == 0:
+                    self._conn.execute(
+                        "DELETE FROM responses WHERE rowid NOT IN "
+                        "(SELECT rowid FROM responses ORDER BY rowid DESC LIMIT ?)",
+                        (self.max_rows,)
+                    )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning("[RESPONSE_CACHE] write failed: %s", e)
@@ -1,5 +1,7 @@
 # project_root/core/scheduler.py
 
+import heapq
+import itertools
 import logging
 from datetime import datetime, timedelta
 import threading
@@ -10,30 +12,51 @@ class TaskScheduler:
     """
     The only non-event-driven code. Invokes a function of a given module
     at a specified time, with the specified args.
+
+    One daemon thread sleeps until the earliest pending task is due, instead of
+    a thread per task blocked in wait() for its whole delay. Each due task then
+    runs on its own short-lived thread, so a slow task doesn't delay the others.
+    The loop thread starts with the first schedule() call, so schedulers that
+    never get a task (e.g. a SnippetsRunner a snippet builds) cost no thread.
     """
 
     def __init__(self):
-        self.scheduled_tasks = []
+        self.scheduled_tasks = []  # heap of (run_time, seq, func, args, kwargs); pending only
+        self._seq = itertools.count()  # tie-breaker so equal run_times never compare funcs
+        self._cond = threading.Condition()
+        self._loop_started = False
 
     def schedule(self, run_time, func, *args, **kwargs):
         logger.info("[SCHEDULER] Task scheduled at %s for %s(%s, %s)",
                     run_time, func.__name__, args, kwargs)
-        self.scheduled_tasks.append((run_time, func, args, kwargs))
-        t = threading.Thread(target=self._wait_and_run, args=(run_time, func, args, kwargs))
-        t.daemon = True
-        t.start()
-
-    def _wait_and_run(self, run_time, func, args, kwargs):
-        now = datetime.now()
-        delta = (run_time - now).total_seconds()
-        if delta > 0:
-            logger.debug("[SCHEDULER] Waiting %s seconds before running %s", delta, func.__name__)
-        else:
-            logger.debug("[SCHEDULER] run_time is in the past for %s, running now.", func.__name__)
-            delta = 0
-        threading.Event().wait(delta)
-        logger.info("[SCHEDULER] Running scheduled task: %s", func.__name__)
-        func(*args, **kwargs)
+        with self._cond:
+            if not self._loop_started:
+                threading.Thread(target=self._run_loop, daemon=True).start()
+                self._loop_started = True
+            heapq.heappush(self.scheduled_tasks, (run_time, next(self._seq), func, args, kwargs))
+            # Wake the loop in case this task is due before the one it's sleeping on
+            self._cond.notify()
+
+    def _run_loop(self):
+        while True:
+            with self._cond:
+                while not self.scheduled_tasks:
+                    self._cond.wait()
+                run_time = self.scheduled_tasks[0][0]
+                delta = (run_time - datetime.now()).total_seconds()
+                if delta > 0:
+                    self._cond.wait(delta)
+                    continue  # re-check: time passed or an earlier task arrived
+                _, _, func, args, kwargs = heapq.heappop(self.scheduled_tasks)
+
+            logger.info("[SCHEDULER] Running scheduled task: %s", func.__name__)
+            threading.Thread(target=self._run_task, args=(func, args, kwargs), daemon=True).start()
+
+    def _run_task(self, func, args, kwargs):
+        try:
+            func(*args, **kwargs)
+        except Exception as e:
+            logger.error("[SCHEDULER] Scheduled task %s failed: %s", func.__name__, e, exc_info=True)
 
     def schedule_in(self, seconds, func, *args, **kwargs):
         run_time = datetime.now() + timedelta(seconds=seconds)
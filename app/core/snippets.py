@@ -1,7 +1,10 @@
 # project_root/core/snippets.py
 
+import io
+import sys
 import logging
 from .scheduler import TaskScheduler
+from services.slack_service import SlackService
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +16,7 @@ class SnippetsRunner:
 
     def __init__(self):
         self.scheduler = TaskScheduler()
+        self.slack_service = SlackService()
 
     def run_snippet_now(self, snippet_callable, channel, thread_ts):
         """
@@ -20,7 +24,6 @@ class SnippetsRunner:
         Capture stdout so we can post any `print` output to Slack.
         If snippet throws an exception, we also post an error message to Slack.
         """
-        import sys, io
         logger.info("[SNIPPETS] Running snippet immediately: %s", snippet_callable.__name__)
 
         old_stdout = sys.stdout
@@ -36,13 +39,13 @@ class SnippetsRunner:
 
             snippet_output = captured_out.getvalue().strip()
             if snippet_output:
-                SlackService().post_message(
+                self.slack_service.post_message(
                     channel=channel,
                     text=f"**Snippet partial output before crash**:\n```\n{snippet_output}\n```",
                     thread_ts=thread_ts
                 )
 
-            SlackService().post_message(
+            self.slack_service.post_message(
                 channel=channel,
                 text=f":x: The snippet crashed with an exception:\n```\n{e}\n```",
                 thread_ts=thread_ts
@@ -51,13 +54,13 @@ class SnippetsRunner:
             # If snippet succeeded, post any captured print output plus success message
             snippet_output = captured_out.getvalue().strip()
             if snippet_output:
-                SlackService().post_message(
+                self.slack_service.post_message(
                     channel=channel,
                     text=f"**Snippet output**:\n```\n{snippet_output}\n```",
                     thread_ts=thread_ts
                 )
 
-            SlackService().post_message(
+            self.slack_service.post_message(
                 channel=channel, 
                 text="Snippet executed successfully!",
                 thread_ts=thread_ts
@@ -1,11 +1,25 @@
 # project_root/modules/askthebot_manager.py
 
 import logging
+import threading
+from collections import OrderedDict
+
 from core.module_manager import BaseModule
-from services.chatgpt_service import ChatGPTService
+from core.configs import bot_config
+from services.chatgpt_service import ChatGPTService, FALLBACK_REPLY
 
 logger = logging.getLogger(__name__)
 
+# Fixed for every question, so built once and shared by each request's message list.
+ASKTHEBOT_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": (
+        "You are an assistant that knows the Slackbot's internal modules, file structure, and usage. "
+        "Provide helpful answers about the bot's design, referencing code or config if needed. "
+        "Don't reveal sensitive credentials."
+    )
+}
+
 class AskTheBotManager(BaseModule):
     """
     Answers questions about the bot's internal architecture.
@@ -17,25 +31,48 @@ class AskTheBotManager(BaseModule):
     def initialize(self):
         logger.info("[INIT] AskTheBotManager initialized.")
         self.gpt_service = ChatGPTService()
+        # (model, temperature, question) -> answer. Architecture questions are
+        # single-turn, so a repeated question needs no new GPT call.
+        self._answer_cache = OrderedDict()
+        self._answer_cache_lock = threading.Lock()
 
     def handle_bot_question(self, user_text, user_id, channel, thread_ts):
         logger.debug("[ASKTHEBOT] handle_bot_question => user_text='%s', user_id='%s', channel='%s', thread_ts='%s'",
                      user_text, user_id, channel, thread_ts)
 
-        system_prompt = (
-            "You are an assistant that knows the Slackbot's internal modules, file structure, and usage. "
-            "Provide helpful answers about the bot's design, referencing code or config if needed. "
-            "Don't reveal sensitive credentials."
-        )
+        model = "gpt-3.5-turbo"
+        temperature = 0.6
+        key = (model, temperature, user_text.strip())
+        with self._answer_cache_lock:
+            cached = self._answer_cache.get(key)
+            if cached is not None:
+                self._answer_cache.move_to_end(key)
+                logger.debug("[ASKTHEBOT] cache hit => '%s'", user_text)
+                return cached
+
         conversation = [
-            {"role": "system", "content": system_prompt},
+            ASKTHEBOT_SYSTEM_MESSAGE,
             {"role": "user", "content": user_text}
         ]
 
         response_text = self.gpt_service.chat_with_history(
             conversation=conversation,
-            model="gpt-3.5-turbo",
-            temperature=0.6
+            model=model,
+            temperature=temperature
         )
+        if response_text != FALLBACK_REPLY:
+            max_entries = bot_config.get("askthebot_cache_size", 128)
+            with self._answer_cache_lock:
+                self._answer_cache[key] = response_text
+                while len(self._answer_cache) > max_entries:
+                    self._answer_cache.popitem(last=False)
         logger.info("[ASKTHEBOT] Generated response for architecture Q: %s", response_text[:100] + "...")
         return response_text
+
+    def clear_cache(self):
+        """
+        Forget cached answers, e.g. after a snippet changes the bot's code or
+        config and earlier architecture answers may be stale.
+        """
+        with self._answer_cache_lock:
+            self._answer_cache.clear()
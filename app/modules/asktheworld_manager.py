@@ -1,34 +1,206 @@
 # project_root/modules/asktheworld_manager.py
 
+import logging
+import time
+import threading
 from core.module_manager import BaseModule
-from services.chatgpt_service import ChatGPTService
+from core.configs import bot_config
+from services.chatgpt_service import ChatGPTService, FALLBACK_REPLY
 from services.slack_service import SlackService
 
+logger = logging.getLogger(__name__)
+
+# Context window per model, in tokens; unknown models get the smallest one.
+MODEL_CONTEXT_TOKENS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4o": 128000,
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+SUMMARY_PREFIX = "[Summary of earlier turns: "
+
+
+def _estimate_tokens(message):
+    # ~4 characters per token is close enough for budgeting
+    return (len(message["content"]) + len(message["role"])) // 4
+
+
+def _first_sentence(text, limit=100):
+    sentence = text.strip().split("\n", 1)[0].split(". ", 1)[0]
+    return sentence if len(sentence) <= limit else sentence[:limit] + "..."
+
 class AskTheWorldManager(BaseModule):
     module_name = "asktheworld_manager"
     module_type = "ASKTHEWORLD"
 
     def initialize(self):
-        print("[INIT] AskTheWorldManager initialized.")
+        logger.info("[INIT] AskTheWorldManager initialized.")
         self.gpt_service = ChatGPTService()
         self.slack_service = SlackService()
         self.thread_conversations = {}  # Slack thread_ts -> conversation list
+        self.thread_last_active = {}    # Slack thread_ts -> time.monotonic() of last turn
+        self.thread_locks = {}          # Slack thread_ts -> Lock serializing that thread's turns
+        # Guards thread_locks and thread_last_active, so handing out a thread's
+        # lock and evicting it as idle can't interleave.
+        self._thread_locks_lock = threading.Lock()
+        threading.Thread(target=self._cleanup_idle_conversations, daemon=True).start()
 
     def handle_inquiry(self, user_text, system_prompt, temperature, user_id, channel, thread_ts):
+        # Turns in one thread run one at a time, so a follow-up sees the previous
+        # answer and two replies can't append to the same history at once.
+        # Different threads don't wait on each other.
+        with self._get_thread_lock(thread_ts):
+            self._answer_in_thread(user_text, system_prompt, temperature, channel, thread_ts)
+
+    def _get_thread_lock(self, thread_ts):
+        """
+        Look up or create the thread's lock and mark the thread active, in one
+        step under _thread_locks_lock. Every lock handed out therefore belongs to
+        a thread the cleanup sees as active, so it is never evicted while a
+        caller still holds or waits on it, and threads whose turns fail get
+        cleaned up like any other.
+        """
+        with self._thread_locks_lock:
+            lock = self.thread_locks.setdefault(thread_ts, threading.Lock())
+            self.thread_last_active[thread_ts] = time.monotonic()
+        return lock
+
+    def _answer_in_thread(self, user_text, system_prompt, temperature, channel, thread_ts):
         conv = self.thread_conversations.get(thread_ts)
         if not conv:
             conv = [{"role": "system", "content": system_prompt}]
 
-        conv.append({"role": "user", "content": user_text})
+        # A new list: the stored history only changes once the answer completes
+        conv = conv + [{"role": "user", "content": user_text}]
+        # Read per call: a snippet switches models by assigning
+        # bot_config["default_qna_model"], a single atomic dict store.
+        model = bot_config.get("default_qna_model", "gpt-3.5-turbo")
+        conv = self._prune_history(conv, model)
+
+        # Post a placeholder right away and edit it as the answer streams in,
+        # so the user sees text after the first tokens instead of the whole reply.
+        placeholder_ts = self.slack_service.post_message(channel=channel, text="_thinking..._", thread_ts=thread_ts)
+
+        # The stream holds a shared OpenAI concurrency slot until it's exhausted,
+        # so this loop only collects pieces; the edits (which can sleep on Slack
+        # 429 retries) run on a separate thread.
+        parts = []
+        stream_done = threading.Event()
+        updater = None
+        if placeholder_ts:
+            updater = threading.Thread(
+                target=self._update_while_streaming,
+                args=(channel, placeholder_ts, parts, stream_done),
+                daemon=True
+            )
+            updater.start()
+
+        completed = False
+        try:
+            for piece in self.gpt_service.stream_chat_with_history(
+                conversation=conv,
+                model=model,
+                temperature=temperature
+            ):
+                parts.append(piece)
+            completed = True
+        except Exception as e:
+            logger.error("[ASKTHEWORLD] streaming reply failed after %d pieces: %s", len(parts), e)
+        finally:
+            stream_done.set()
+            if updater:
+                updater.join()
+
+        response_text = "".join(parts)
+        if completed and not response_text:
+            # Slack rejects an empty chat.update (no_text), which would leave the
+            # placeholder up, and an empty turn is no use in the history either.
+            logger.warning("[ASKTHEWORLD] stream finished with no content for thread_ts=%s", thread_ts)
+            completed = False
+        if completed:
+            conv.append({"role": "assistant", "content": response_text})
+            self.thread_conversations[thread_ts] = conv
+            with self._thread_locks_lock:
+                self.thread_last_active[thread_ts] = time.monotonic()
+        else:
+            # Show whatever arrived plus the apology, but keep the partial answer
+            # (and its unanswered question) out of the thread's history.
+            response_text = (response_text + "\n\n" + FALLBACK_REPLY) if response_text else FALLBACK_REPLY
+
+        # Final, complete answer
+        if placeholder_ts:
+            self.slack_service.update_message(channel, placeholder_ts, response_text)
+        else:
+            self.slack_service.post_message(channel=channel, text=response_text, thread_ts=thread_ts)
+
+    def _update_while_streaming(self, channel, ts, parts, stream_done):
+        """
+        Edit the placeholder with the text streamed so far, at most once per
+        stream_update_interval_seconds (chat.update is rate-limited per channel),
+        until stream_done is set. The final edit is left to the caller.
+        """
+        update_interval = bot_config.get("stream_update_interval_seconds", 1.0)
+        shown = 0
+        while not stream_done.wait(update_interval):
+            count = len(parts)
+            if count != shown:
+                self.slack_service.update_message(channel, ts, "".join(parts[:count]))
+                shown = count
+
+    def _prune_history(self, conv, model):
+        """
+        Keep a thread's history within a token budget: the smaller of
+        qna_history_max_tokens and 80% of the model's context. Over budget, the
+        older turns are folded into one "[Summary of earlier turns: ...]" system
+        message built from their first sentences (no extra GPT call), keeping the
+        system prompt and the newest qna_history_keep_messages verbatim.
+        """
+        budget = min(bot_config.get("qna_history_max_tokens", 6000),
+                     int(MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS) * 0.8))
+        if sum(_estimate_tokens(m) for m in conv) <= budget:
+            return conv
 
-        response_text = self.gpt_service.chat_with_history(
-            conversation=conv,
-            model="gpt-3.5-turbo",  # or from bot_config["default_qna_model"]
-            temperature=temperature
-        )
+        keep = bot_config.get("qna_history_keep_messages", 6)
+        head, body = conv[:1], conv[1:]
+        if len(body) <= keep:
+            return conv
 
-        conv.append({"role": "assistant", "content": response_text})
-        self.thread_conversations[thread_ts] = conv
+        old, recent = body[:-keep], body[-keep:]
+        if recent[0]["role"] == "assistant":
+            # start the kept part on a user turn
+            old, recent = old + recent[:1], recent[1:]
+        points = []
+        for msg in old:
+            if msg["role"] == "system" and msg["content"].startswith(SUMMARY_PREFIX):
+                points.append(msg["content"][len(SUMMARY_PREFIX):-1])  # earlier summary
+            elif msg["role"] == "user":
+                points.append("user asked: " + _first_sentence(msg["content"]))
+            elif msg["role"] == "assistant":
+                points.append("you answered: " + _first_sentence(msg["content"]))
+        summary_text = "; ".join(points)
+        if len(summary_text) > 2000:
+            summary_text = "..." + summary_text[-2000:]  # keep the most recent points
+        summary = {"role": "system", "content": SUMMARY_PREFIX + summary_text + "]"}
+        logger.debug("[ASKTHEWORLD] Pruned %d old messages into a summary", len(old))
+        return head + [summary] + recent
 
-        # Post answer to Slack
-        self.slack_service.post_message(channel=channel, text=response_text, thread_ts=thread_ts)
+    def _cleanup_idle_conversations(self):
+        """
+        Drop conversations of threads nobody has talked in for a while, so
+        abandoned threads don't keep their history in memory forever.
+        """
+        while True:
+            time.sleep(60)
+            idle_limit = bot_config.get("thread_conversation_ttl_minutes", 60) * 60
+            now = time.monotonic()
+            with self._thread_locks_lock:
+                for thread_ts, last_active in list(self.thread_last_active.items()):
+                    if now - last_active <= idle_limit:
+                        continue
+                    lock = self.thread_locks.get(thread_ts)
+                    if lock is not None and lock.locked():
+                        continue  # a turn is still running; try again next pass
+                    self.thread_conversations.pop(thread_ts, None)
+                    self.thread_last_active.pop(thread_ts, None)
+                    self.thread_locks.pop(thread_ts, None)
+                    logger.debug("[ASKTHEWORLD] Dropped idle conversation thread_ts=%s", thread_ts)
@@ -1,7 +1,9 @@
 # project_root/modules/classification_manager.py
 
+import re
 import json
 import logging
+import threading
 
 from core.module_manager import BaseModule
 from core.configs import bot_config
@@ -9,6 +11,12 @@ from services.chatgpt_service import ChatGPTService
 
 logger = logging.getLogger(__name__)
 
+# GPT sometimes wraps the JSON in ```json fences or adds a sentence before it.
+# One DOTALL search from the first "{" to the last "}" pulls it out in a single scan.
+JSON_OBJECT_REGEX = re.compile(r"\{.*\}", re.DOTALL)
+
+REQUEST_TYPES = frozenset({"ASKTHEWORLD", "ASKTHEBOT", "CODER"})
+
 class ClassificationManager(BaseModule):
     module_name = "classification_manager"
     module_type = "CLASSIFIER"
@@ -17,6 +25,7 @@ class ClassificationManager(BaseModule):
         logger.info("[INIT] ClassificationManager with single GPT session.")
         self.gpt_service = ChatGPTService()
         self.classifier_conversation = []
+        self._conversation_lock = threading.Lock()
 
         classification_prompt = bot_config["initial_prompts"].get("classification_system_prompt","")
         big_context = bot_config["initial_prompts"].get("bot_context","")
@@ -31,16 +40,28 @@ class ClassificationManager(BaseModule):
 
     def handle_classification(self, user_text, user_id, channel, thread_ts):
         logger.debug("[CLASSIFIER] user_text='%s'", user_text)
-        self.classifier_conversation.append({"role":"user","content":user_text})
-
-        raw_response = self.gpt_service.classify_chat(self.classifier_conversation)
+        user_msg = {"role":"user","content":user_text}
+
+        # Classify against a snapshot; the user/assistant pair is recorded together
+        # afterwards, so concurrent events can't interleave their turns.
+        with self._conversation_lock:
+            conversation = self.classifier_conversation + [user_msg]
+
+        # JSON mode => the reply is always one parseable object. Keep streaming with an
+        # early stop too: JSON mode can pad the object with whitespace up to max_tokens.
+        # The reply is one small {request_type, role_info, extra_data} object.
+        raw_response = self.gpt_service.classify_chat(conversation,
+                                                      stop_after_json=True, json_mode=True,
+                                                      max_tokens=150)
         logger.debug("[CLASSIFIER] raw => %s", raw_response)
 
         try:
-            parsed = json.loads(raw_response)
-            req_type = parsed.get("request_type","ASKTHEWORLD")
-            role_info= parsed.get("role_info","default")
-            extra_data=parsed.get("extra_data",{})
+            match = JSON_OBJECT_REGEX.search(raw_response)
+            parsed = json.loads(match.group(0) if match else raw_response)
+            req_type, role_info, extra_data = self._validate_classification(parsed)
+            # Remember the classification as GPT gave it; the CODER excerpt below is
+            # a copy of bot_context, which is already in the system message.
+            recorded = json.dumps({"request_type": req_type, "role_info": role_info, "extra_data": extra_data})
 
             # if CODER => optionally add relevant excerpt
             if req_type=="CODER":
@@ -54,22 +75,55 @@ class ClassificationManager(BaseModule):
                 "extra_data": extra_data
             }
 
-            self.classifier_conversation.append({
-                "role":"assistant",
-                "content": json.dumps(final_result)
-            })
+            self._record_turn(user_msg, recorded)
             logger.info("[CLASSIFIER] final => %s", final_result)
             return final_result
 
         except Exception as e:
             logger.error("[CLASSIFIER] parse error => %s", e, exc_info=True)
             fallback = {"request_type":"ASKTHEWORLD","role_info":"default","extra_data":{}}
-            self.classifier_conversation.append({
-                "role":"assistant",
-                "content": "Error fallback => ASKTHEWORLD"
-            })
+            self._record_turn(user_msg, "Error fallback => ASKTHEWORLD")
             return fallback
 
+    def _record_turn(self, user_msg, assistant_content):
+        """
+        Append one user/assistant pair, then keep only the system prompt plus the
+        newest turns, so prompt size (and latency) stays flat instead of growing
+        with every message the bot has ever classified.
+        """
+        max_messages = bot_config.get("classifier_history_messages", 20)
+        with self._conversation_lock:
+            self.classifier_conversation.append(user_msg)
+            self.classifier_conversation.append({"role":"assistant","content":assistant_content})
+            excess = len(self.classifier_conversation) - 1 - max_messages
+            if excess > 0:
+                excess += excess % 2  # drop whole user/assistant pairs
+                del self.classifier_conversation[1:1 + excess]
+
+    def _validate_classification(self, parsed):
+        """
+        Check the classifier JSON shape once, up front. Anything malformed
+        degrades field by field to the ASKTHEWORLD/default/{} fallback instead of
+        being dispatched (e.g. an unknown request_type or a non-dict extra_data).
+        """
+        if not isinstance(parsed, dict):
+            raise ValueError(f"classifier returned {type(parsed).__name__}, expected object")
+
+        req_type = parsed.get("request_type")
+        if req_type not in REQUEST_TYPES:
+            logger.warning("[CLASSIFIER] unknown request_type=%r => ASKTHEWORLD", req_type)
+            req_type = "ASKTHEWORLD"
+
+        role_info = parsed.get("role_info")
+        if not isinstance(role_info, str) or not role_info:
+            role_info = "default"
+
+        extra_data = parsed.get("extra_data")
+        if not isinstance(extra_data, dict):
+            extra_data = {}
+
+        return req_type, role_info, extra_data
+
     def review_snippet(self, snippet_prompt):
         """
         The second pass snippet review. 
@@ -86,6 +140,7 @@ class ClassificationManager(BaseModule):
                 "content": snippet_prompt
             }
         ]
+        # Temperature 0.0, so a re-proposed snippet hits classify_chat's response cache
         raw_sum = self.gpt_service.classify_chat(conv)
         logger.debug("[CLASSIFIER] snippet summary => %s", raw_sum)
         return raw_sum
@@ -97,9 +152,12 @@ class ClassificationManager(BaseModule):
         )
         system_msg = self.classifier_conversation[0]["content"]
 
+        # Keep the large, unchanging part (instructions + bot context) as the leading
+        # system message and only the request in the user turn, so every call shares
+        # the same prefix and OpenAI's automatic prompt caching can reuse it.
         conv = [
-            {"role":"system","content":extraction_prompt},
-            {"role":"user","content":f"BOT CONTEXT:\n{system_msg}\nUSER REQUEST:\n{user_text}"}
+            {"role":"system","content":f"{extraction_prompt}\n\nBOT CONTEXT:\n{system_msg}"},
+            {"role":"user","content":f"USER REQUEST:\n{user_text}"}
         ]
         raw = self.gpt_service.classify_chat(conv)
         logger.debug("[CLASSIFIER] relevant excerpt => %s", raw)
@@ -14,18 +14,14 @@ class CoderManager(BaseModule):
     def initialize(self):
         logger.info("[INIT] CoderManager: uses coder_system_prompt + coder_safety_prompt.")
         self.gpt_service = ChatGPTService()
+        self._system_prompt_sources = None
+        self._system_prompt = None
 
     def generate_snippet(self, user_requirements):
         logger.debug("[CODER_MANAGER] generate_snippet => %s", user_requirements)
 
-        coder_prompt = bot_config["initial_prompts"].get("coder_system_prompt","")
-        safety_prompt= bot_config["initial_prompts"].get("coder_safety_prompt","")
-
-        if not coder_prompt:
-            coder_prompt = "You are a Python code generator. Provide def generated_snippet(...)."
-        # Append the safety prompt for event-driven snippet logic
         conversation = [
-            {"role":"system","content": coder_prompt + "\n\n" + safety_prompt},
+            {"role":"system","content": self._get_system_prompt()},
             {"role":"user","content": user_requirements}
         ]
 
@@ -37,6 +33,23 @@ class CoderManager(BaseModule):
         logger.debug("[CODER_MANAGER] Raw snippet:\n%s", code_str)
         return code_str
 
+    def _get_system_prompt(self):
+        """
+        coder_system_prompt + coder_safety_prompt, joined once and reused.
+        Snippets may edit bot_config["initial_prompts"], so it is rebuilt
+        whenever either source string changes.
+        """
+        coder_prompt = bot_config["initial_prompts"].get("coder_system_prompt","")
+        safety_prompt= bot_config["initial_prompts"].get("coder_safety_prompt","")
+        sources = (coder_prompt, safety_prompt)
+        if sources != self._system_prompt_sources:
+            if not coder_prompt:
+                coder_prompt = "You are a Python code generator. Provide def generated_snippet(...)."
+            # Append the safety prompt for event-driven snippet logic
+            self._system_prompt = coder_prompt + "\n\n" + safety_prompt
+            self._system_prompt_sources = sources
+        return self._system_prompt
+
     def create_snippet_callable(self, code_str):
         logger.debug("[CODER_MANAGER] create_snippet_callable => code_str length=%d", len(code_str))
         local_env = {}
@@ -1,14 +1,17 @@
 # project_root/modules/personality_manager.py
 
+import logging
 from core.module_manager import BaseModule
 from core.configs import bot_config
 
+logger = logging.getLogger(__name__)
+
 class PersonalityManager(BaseModule):
     module_name = "personality_manager"
     module_type = "PERSONALITY"
 
     def initialize(self):
-        print("[INIT] PersonalityManager initialized.")
+        logger.info("[INIT] PersonalityManager initialized.")
 
     def get_system_prompt_and_temp(self, role):
         roles_def = bot_config.get("roles_definitions", {})
@@ -5,6 +5,7 @@ import uuid
 import os
 import time
 import threading
+from collections import defaultdict
 from datetime import datetime, timedelta
 
 from core.module_manager import BaseModule
@@ -23,12 +24,77 @@ logger = logging.getLogger(__name__)
 # }
 snippet_storage = {}
 
+# The only typed commands accepted in a thread with a pending snippet.
+SNIPPET_COMMANDS = frozenset({"confirm", "cancel", "extend"})
+
+# final_decision -> set of snippet_ids. Lets the watchdog and the per-thread
+# lookups read only the IDs in the state they care about instead of scanning
+# (and dereferencing) every stored snippet.
+snippet_status_index = defaultdict(set)
+_storage_lock = threading.Lock()
+
+
+def _store_snippet(snippet_id, entry):
+    with _storage_lock:
+        snippet_storage[snippet_id] = entry
+        snippet_status_index[entry["final_decision"]].add(snippet_id)
+
+
+# final_decision state machine. None = waiting for a typed command.
+# Staying in the same state (e.g. "extend" on a pending snippet) is always allowed.
+ALLOWED_TRANSITIONS = {
+    None: frozenset({"running", "cancel"}),
+    "running": frozenset(),
+    "cancel": frozenset(),
+}
+
+
+def _transition(snippet_id, expected, new_status, mutate=None):
+    """
+    Atomically check that a snippet is in `expected`, apply `mutate(entry)` if
+    given, and move it to `new_status` (keeping snippet_status_index in sync).
+    Returns the entry, or None if the snippet is gone or no longer in `expected`,
+    so concurrent confirm/cancel/extend commands can't both act on it.
+    """
+    if new_status != expected and new_status not in ALLOWED_TRANSITIONS[expected]:
+        raise ValueError(f"Invalid snippet transition {expected!r} -> {new_status!r}")
+
+    with _storage_lock:
+        entry = snippet_storage.get(snippet_id)
+        if entry is None or entry["final_decision"] != expected:
+            return None
+        if mutate:
+            mutate(entry)
+        if new_status != expected:
+            snippet_status_index[expected].discard(snippet_id)
+            entry["final_decision"] = new_status
+            snippet_status_index[new_status].add(snippet_id)
+        return entry
+
+
+def _snippet_ids_with_status(status):
+    with _storage_lock:
+        return list(snippet_status_index[status])
+
+
+def discard_snippet(snippet_id):
+    """
+    Remove a snippet from storage and from the status index.
+    """
+    with _storage_lock:
+        entry = snippet_storage.pop(snippet_id, None)
+        if entry is not None:
+            snippet_status_index[entry["final_decision"]].discard(snippet_id)
+        return entry
+
+
 class SnippetManager(BaseModule):
     module_name = "snippet_manager"
     module_type = "SNIPPET_MANAGER"
 
     def initialize(self):
         logger.info("[INIT] SnippetManager with watchers for snippet freeze & expiry.")
+        self.slack_service = SlackService()
         threading.Thread(target=self._snippet_watchdog, daemon=True).start()
         threading.Thread(target=self._cleanup_expired_snippets, daemon=True).start()
 
@@ -40,19 +106,31 @@ class SnippetManager(BaseModule):
         line_limit = bot_config.get("snippet_line_limit", 250)
         lines = snippet_code.strip().split("\n")
         if len(lines) > line_limit:
-            SlackService().post_message(
+            self.slack_service.post_message(
                 channel=channel,
                 text=f"Snippet too large ({len(lines)}/{line_limit} lines). Please simplify or break it down.",
                 thread_ts=thread_ts
             )
             return None
 
+        # Pending snippets only leave storage on a typed command or expiry, so cap
+        # them to keep a burst of CODER requests from piling up code in memory.
+        max_pending = bot_config.get("snippet_max_pending", 100)
+        if len(_snippet_ids_with_status(None)) >= max_pending:
+            logger.warning("[SNIPPET_MANAGER] %d snippets already pending, refusing new proposal.", max_pending)
+            self.slack_service.post_message(
+                channel=channel,
+                text="Too many snippets are waiting for confirmation right now. Please try again in a few minutes.",
+                thread_ts=thread_ts
+            )
+            return None
+
         expiry_minutes = bot_config.get("snippet_expiration_minutes", 5)
         now = datetime.utcnow()
         expires_at = now + timedelta(minutes=expiry_minutes)
 
         snippet_id = str(uuid.uuid4())
-        snippet_storage[snippet_id] = {
+        _store_snippet(snippet_id, {
             "code": snippet_code,
             "summary": snippet_summary,
             "channel": channel,
@@ -63,9 +141,9 @@ class SnippetManager(BaseModule):
             "start_time": now,
             "alerted_admin": False,
             "final_decision": None
-        }
+        })
 
-        SlackService().post_message(
+        self.slack_service.post_message(
             channel=channel,
             text=(
                 f":robot_face: *Snippet Proposed (ID={snippet_id})*\n"
@@ -73,7 +151,7 @@ class SnippetManager(BaseModule):
                 f"*User request:* {user_text}\n\n"
                 f"*Snippet Code*:\n```python\n{snippet_code}\n```\n\n"
                 f"*Snippet Summary:*\n{snippet_summary}\n\n"
-                "**Type EXACTLY** `confirm`, `cancel`, or `extend` **in the next message** with no punctuation, no uppercase, no mention.**\n"
+                "**Reply with EXACTLY** `confirm`, `cancel`, or `extend` **in this thread** (mentioning me is fine), with no punctuation and no uppercase.\n"
                 f"(Expires in {expiry_minutes} min.)"
             ),
             thread_ts=thread_ts
@@ -83,20 +161,22 @@ class SnippetManager(BaseModule):
     def handle_typed_command(self, user_text, user_id, channel, thread_ts):
         """
         Strictly matches EXACT lowercase 'confirm', 'cancel', or 'extend'.
-        e.g. 'Confirm', 'confirm?', '@bot confirm' => are all ignored.
+        e.g. 'Confirm', 'confirm?', 'confirm it' => are all ignored.
+        BotEngine strips user mentions first, so '@bot confirm' counts as 'confirm'.
         
         Return a dict if snippet was confirmed => BotEngine to run snippet.
         Otherwise None if no snippet or no valid command.
         """
         cmd = user_text.strip()  # no .lower(), we want exact
-        if cmd not in ["confirm","cancel","extend"]:
+        if cmd not in SNIPPET_COMMANDS:
             return None
 
-        # find snippet in snippet_storage
+        # find the newest pending snippet in this thread
         best_sid = None
         best_time = None
-        for sid, data in snippet_storage.items():
-            if data["channel"] == channel and data["thread_ts"] == thread_ts and data["final_decision"] is None:
+        for sid in _snippet_ids_with_status(None):
+            data = snippet_storage.get(sid)
+            if data and data["channel"] == channel and data["thread_ts"] == thread_ts:
                 if best_time is None or data["start_time"] > best_time:
                     best_sid = sid
                     best_time = data["start_time"]
@@ -107,32 +187,39 @@ class SnippetManager(BaseModule):
         return self._apply_snippet_action(best_sid, cmd)
 
     def _apply_snippet_action(self, snippet_id, action_value):
-        if snippet_id not in snippet_storage:
+        # A single get: a concurrent cancel, expiry or discard can remove the
+        # snippet between a membership check and an index.
+        entry = snippet_storage.get(snippet_id)
+        if entry is None:
             return None
 
-        entry = snippet_storage[snippet_id]
         now = datetime.utcnow()
         if now > entry["expires_at"]:
-            SlackService().post_message(
+            self.slack_service.post_message(
                 channel=entry["channel"],
                 text="Snippet expired. No changes made.",
                 thread_ts=entry["thread_ts"]
             )
-            snippet_storage.pop(snippet_id, None)
+            discard_snippet(snippet_id)
             return None
 
         if action_value == "confirm":
-            # Set final_decision="running" and keep it in snippet_storage
-            entry["final_decision"] = "running"
+            # Set final_decision="running" and keep it in snippet_storage.
+            # Only one command can win: a duplicate delivery finds it already running.
+            if not _transition(snippet_id, None, "running"):
+                logger.info("[SNIPPET_MANAGER] Snippet ID=%s no longer pending, ignoring confirm.", snippet_id)
+                return None
             return {
                 "action": "execute_snippet",   # Let BotEngine do snippet execution
                 "snippet_id": snippet_id,      # We'll remove it from storage once it finishes
             }
 
         elif action_value == "cancel":
-            entry["final_decision"] = "cancel"
-            snippet_storage.pop(snippet_id, None)
-            SlackService().post_message(
+            if not _transition(snippet_id, None, "cancel"):
+                logger.info("[SNIPPET_MANAGER] Snippet ID=%s no longer pending, ignoring cancel.", snippet_id)
+                return None
+            discard_snippet(snippet_id)
+            self.slack_service.post_message(
                 channel=entry["channel"],
                 text="Snippet canceled. No changes made.",
                 thread_ts=entry["thread_ts"]
@@ -140,11 +227,15 @@ class SnippetManager(BaseModule):
             return None
 
         elif action_value == "extend":
-            new_expires = entry["expires_at"] + timedelta(minutes=5)
-            entry["expires_at"] = new_expires
-            SlackService().post_message(
+            def _extend(data):
+                data["expires_at"] = data["expires_at"] + timedelta(minutes=5)
+
+            if not _transition(snippet_id, None, None, mutate=_extend):
+                logger.info("[SNIPPET_MANAGER] Snippet ID=%s no longer pending, ignoring extend.", snippet_id)
+                return None
+            self.slack_service.post_message(
                 channel=entry["channel"],
-                text=f"Snippet expiration extended to {new_expires} UTC.",
+                text=f"Snippet expiration extended to {entry['expires_at']} UTC.",
                 thread_ts=entry["thread_ts"]
             )
             return None
@@ -158,31 +249,28 @@ class SnippetManager(BaseModule):
             admin_timeout = bot_config.get("admin_watchdog_timeout_seconds", 3600)
             force_terminate = bot_config.get("force_bot_termination_on_snippet_freeze", True)
 
-            for sid, data in list(snippet_storage.items()):
-                # If final_decision is "running", it's actively confirmed & presumably running
-                if data["final_decision"] == "running":
-                    age = (now - data["start_time"]).total_seconds()
-                    # optional: post a first warning if over watch_secs
-                    if (not data["alerted_admin"]) and (age > watch_secs):
-                        SlackService().post_message(
-                            channel=data["channel"],
-                            text=(f":warning: Snippet ID={sid} has been running ~{int(age)}s. "
-                                  f"If no completion in {int(admin_timeout/60)} min, bot may terminate."),
-                            thread_ts=data["thread_ts"]
-                        )
-                        data["alerted_admin"] = True
-
-                    if force_terminate and (age > admin_timeout):
-                        logger.error("[SNIPPET_MANAGER] Snippet ID=%s stuck >%ds => forcibly terminating container",
-                                     sid, admin_timeout)
-                        os._exit(1)
+            # Only confirmed snippets ("running") can freeze; pending ones are
+            # handled by _cleanup_expired_snippets.
+            for sid in _snippet_ids_with_status("running"):
+                data = snippet_storage.get(sid)
+                if data is None:
+                    continue
 
-                elif data["final_decision"] is None:
-                    # The snippet is still waiting for confirm/cancel
-                    age = (now - data["start_time"]).total_seconds()
-                    ...
-                    # same logic you had for "alerted_admin" and "os._exit(1)" if too old
+                age = (now - data["start_time"]).total_seconds()
+                # optional: post a first warning if over watch_secs
+                if (not data["alerted_admin"]) and (age > watch_secs):
+                    self.slack_service.post_message(
+                        channel=data["channel"],
+                        text=(f":warning: Snippet ID={sid} has been running ~{int(age)}s. "
+                              f"If no completion in {int(admin_timeout/60)} min, bot may terminate."),
+                        thread_ts=data["thread_ts"]
+                    )
+                    data["alerted_admin"] = True
 
+                if force_terminate and (age > admin_timeout):
+                    logger.error("[SNIPPET_MANAGER] Snippet ID=%s stuck >%ds => forcibly terminating container",
+                                 sid, admin_timeout)
+                    os._exit(1)
 
     def _cleanup_expired_snippets(self):
         while True:
@@ -191,16 +279,16 @@ class SnippetManager(BaseModule):
             for sid, data in list(snippet_storage.items()):
                 if now > data["expires_at"]:
                     if data["final_decision"] is None:
-                        SlackService().post_message(
+                        self.slack_service.post_message(
                             channel=data["channel"],
                             text=(f"Snippet ID={sid} expired with no final decision. No changes applied."),
                             thread_ts=data["thread_ts"]
                         )
-                    snippet_storage.pop(sid, None)
+                    discard_snippet(sid)
 
     def has_pending_snippet_in(self, channel, thread_ts):
-        for sid, data in snippet_storage.items():
-            if data["channel"] == channel and data["thread_ts"] == thread_ts:
-                if data["final_decision"] is None:
-                    return True
+        for sid in _snippet_ids_with_status(None):
+            data = snippet_storage.get(sid)
+            if data and data["channel"] == channel and data["thread_ts"] == thread_ts:
+                return True
         return False
@@ -1,11 +1,52 @@
 # project_root/services/chatgpt_service.py
 
 import os
+import json
 import openai
 import logging
+import time
+import threading
+
+from core.rate_limiter import RequestThrottle
+from core.response_cache import ResponseCache
 
 logger = logging.getLogger(__name__)
 
+# classify_chat runs at temperature 0, so identical requests get identical
+# replies; keep them on disk so repeats skip the API, even across restarts.
+# Set CHATGPT_CACHE_PATH="" to disable.
+_classify_cache = None
+_classify_cache_lock = threading.Lock()
+
+def _get_classify_cache():
+    global _classify_cache
+    if _classify_cache is None:
+        with _classify_cache_lock:
+            if _classify_cache is None:
+                _classify_cache = ResponseCache(os.environ.get("CHATGPT_CACHE_PATH", ".chatgpt_cache.db"))
+    return _classify_cache
+
+# Shared by every ChatGPTService instance: caps concurrent OpenAI requests and
+# paces them to the account's RPM and TPM, so bursts queue here rather than draw 429s.
+_openai_throttle = RequestThrottle(
+    max_concurrent=int(os.environ.get("OPENAI_MAX_CONCURRENCY", "8")),
+    requests_per_minute=int(os.environ.get("OPENAI_REQUESTS_PER_MINUTE", "500")),
+    tokens_per_minute=int(os.environ.get("OPENAI_TOKENS_PER_MINUTE", "200000"))
+)
+RATE_LIMIT_RETRIES = 3
+
+def _estimate_request_tokens(params):
+    """
+    What a request counts against TPM: ~4 characters per prompt token, plus
+    max_tokens, which OpenAI reserves up front for the reply.
+    """
+    chars = sum(len(m.get("content") or "") for m in params.get("messages", []))
+    return chars // 4 + params.get("max_tokens", 0)
+
+# What chat_with_history returns when the API call fails. The streaming call
+# raises instead; AskTheWorld shows this after whatever text already arrived.
+FALLBACK_REPLY = "I'm having trouble responding right now."
+
 class ChatGPTService:
     """
     Handles ChatGPT calls for both classification and Q&A with conversation history.
@@ -17,36 +58,175 @@ class ChatGPTService:
             raise ValueError("OPENAI_API_KEY not set.")
         openai.api_key = self.api_key
 
-    def classify_chat(self, conversation):
+    def classify_chat(self, conversation, stop_after_json=False, json_mode=False, max_tokens=300):
         """
         Used by classification_manager. Usually temperature=0.0 for deterministic JSON.
         'conversation' is a list of messages (role='system'|'user'|'assistant').
+        With stop_after_json=True the reply is streamed and cut off as soon as the
+        first JSON object is complete, so we don't wait on trailing tokens.
+        With json_mode=True OpenAI's JSON mode guarantees the reply is a single JSON
+        object (the prompt must mention JSON). max_tokens caps the reply; callers
+        that expect a short answer should pass a smaller budget.
         """
         try:
-            response = openai.ChatCompletion.create(
+            params = dict(
                 model="gpt-3.5-turbo",
                 messages=conversation,
                 temperature=0.0,
-                max_tokens=300
+                max_tokens=max_tokens
             )
-            return response["choices"][0]["message"]["content"]
+            if json_mode:
+                params["response_format"] = {"type": "json_object"}
+
+            cache = _get_classify_cache()
+            cache_key = ResponseCache.make_key({"params": params, "stop_after_json": stop_after_json})
+            cached = cache.get(cache_key)
+            if cached is not None:
+                logger.debug("[CHATGPT] classify_chat cache hit")
+                return cached
+
+            complete = True
+            if stop_after_json:
+                content = self._stream_first_json_object(params)
+            else:
+                with _openai_throttle.concurrency:
+                    response = self._create_completion(**params)
+                self._log_usage("classify_chat", response)
+                content = response["choices"][0]["message"]["content"]
+                complete = response["choices"][0].get("finish_reason") == "stop"
+            # The error fallback below is never cached
+            if self._is_cacheable_reply(content, complete, stop_after_json or json_mode):
+                cache.put(cache_key, content)
+            return content
         except Exception as e:
-            logger.error(f"ChatGPT classify_chat error: {e}")
+            logger.error("ChatGPT classify_chat error: %s", e)
             return """{"request_type":"ASKTHEWORLD","role_info":"default","extra_data":{}}"""
 
-    def chat_with_history(self, conversation, model="gpt-3.5-turbo", temperature=0.7):
+    def chat_with_history(self, conversation, model="gpt-3.5-turbo", temperature=0.7, max_tokens=800):
         """
         For the 'AskTheWorld' Q&A manager. 'conversation' is a list of
         dicts with roles: 'system', 'user', 'assistant'.
         """
         try:
-            response = openai.ChatCompletion.create(
+            with _openai_throttle.concurrency:
+                response = self._create_completion(
+                    model=model,
+                    messages=conversation,
+                    temperature=temperature,
+                    max_tokens=max_tokens
+                )
+            self._log_usage("chat_with_history", response)
+            return response["choices"][0]["message"]["content"]
+        except Exception as e:
+            logger.error("ChatGPT chat_with_history error: %s", e)
+            return FALLBACK_REPLY
+
+    def stream_chat_with_history(self, conversation, model="gpt-3.5-turbo", temperature=0.7, max_tokens=800):
+        """
+        Streaming variant of chat_with_history: yields the answer piece by piece
+        as GPT produces it. Errors propagate, since the caller may already have
+        shown part of the answer and has to decide what to do with it.
+        The concurrency slot stays taken until the generator is exhausted, so
+        consume it promptly and do slow work (e.g. Slack calls) elsewhere.
+        """
+        with _openai_throttle.concurrency:
+            response = self._create_completion(
                 model=model,
                 messages=conversation,
                 temperature=temperature,
-                max_tokens=800
+                max_tokens=max_tokens,
+                stream=True
             )
-            return response["choices"][0]["message"]["content"]
-        except Exception as e:
-            logger.error(f"ChatGPT chat_with_history error: {e}")
-            return "I'm having trouble responding right now."
+            for chunk in response:
+                text = chunk["choices"][0]["delta"].get("content", "")
+                if text:
+                    yield text
+
+    def _create_completion(self, **params):
+        """
+        openai.ChatCompletion.create, paced by the shared RPM/TPM buckets and retried
+        on 429 (RateLimitError) after the server's Retry-After, or an exponential
+        backoff when it doesn't send one. Callers hold a concurrency slot.
+        """
+        estimated_tokens = _estimate_request_tokens(params)
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            _openai_throttle.wait_for_request(estimated_tokens)
+            try:
+                return openai.ChatCompletion.create(**params)
+            except openai.error.RateLimitError as e:
+                if attempt == RATE_LIMIT_RETRIES:
+                    raise
+                retry_after = (e.headers or {}).get("retry-after")
+                try:
+                    delay = float(retry_after)
+                except (TypeError, ValueError):
+                    delay = 2 ** attempt
+                logger.warning("[CHATGPT] rate limited (attempt %d), retrying in %.1fs", attempt + 1, delay)
+                time.sleep(delay)
+
+    def _log_usage(self, call_name, response):
+        """
+        Debug-log token usage, including how much of the prompt OpenAI served
+        from its prompt cache (shared leading prefixes of 1024+ tokens).
+        """
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        usage = response.get("usage") or {}
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+        logger.debug("[CHATGPT] %s usage => prompt=%s (cached=%s), completion=%s",
+                     call_name, usage.get("prompt_tokens"), cached, usage.get("completion_tokens"))
+
+    def _is_cacheable_reply(self, content, complete, expects_json):
+        """
+        Cache keys are deterministic, so a bad reply stored once would be served
+        forever. When the caller expects JSON only a reply that parses to an
+        object qualifies (not a stream cut off mid-object, or prose); plain-text
+        replies qualify if GPT finished them rather than hitting max_tokens.
+        """
+        if not content:
+            return False
+        if not expects_json:
+            return complete
+        try:
+            return isinstance(json.loads(content), dict)
+        except ValueError:
+            return False
+
+    def _stream_first_json_object(self, params):
+        """
+        Stream a completion and return once the first top-level {...} closes.
+        Braces inside JSON strings are ignored. If the stream ends first, the
+        partial text is returned as is.
+        """
+        with _openai_throttle.concurrency:
+            response = self._create_completion(stream=True, **params)
+            parts = []
+            depth = 0
+            in_string = False
+            escaped = False
+            try:
+                for chunk in response:
+                    text = chunk["choices"][0]["delta"].get("content") or ""
+                    parts.append(text)
+                    for ch in text:
+                        if in_string:
+                            if escaped:
+                                escaped = False
+                            elif ch == "\\":
+                                escaped = True
+                            elif ch == '"':
+                                in_string = False
+                        elif ch == '"':
+                            in_string = depth > 0
+                        elif ch == "{":
+                            depth += 1
+                        elif ch == "}" and depth > 0:
+                            depth -= 1
+                            if depth == 0:
+                                return "".join(parts)
+                return "".join(parts)
+            finally:
+                # Stop reading the rest of the stream on the early return
+                close = getattr(response, "close", None)
+                if close:
+                    close()
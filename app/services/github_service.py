@@ -2,53 +2,190 @@
 
 import os
 import requests
+import time
 import logging
+import threading
 import base64
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger(__name__)
 
+# Longest we'll block a request thread waiting out a GitHub rate limit; past
+# this the limited response is returned to the caller as a failure.
+MAX_RATE_LIMIT_WAIT_SECONDS = 60
+RATE_LIMIT_RETRIES = 2
+
+# Read once at import. The deployment sets GH_*; the GITHUB_* names are
+# accepted as fallbacks so either convention configures the same service.
+GH_TOKEN = os.environ.get("GH_TOKEN") or os.environ.get("GITHUB_TOKEN")
+GH_OWNER = os.environ.get("GH_OWNER") or os.environ.get("GITHUB_OWNER", "")
+GH_REPO_NAME = os.environ.get("GH_REPO_NAME") or os.environ.get("GITHUB_REPO", "")
+GITHUB_API_URL = "https://api.github.com"
+# Base URL for the configured repo, built once; other owner/repo pairs are
+# formatted per call in _repo_url.
+DEFAULT_REPO_URL = f"{GITHUB_API_URL}/repos/{GH_OWNER}/{GH_REPO_NAME}"
+
+# Shared by every GitHubService instance. Snippets construct GitHubService()
+# per use, so per-instance sessions and ETag maps were thrown away each time.
+_sessions = {}  # GH token -> keep-alive requests.Session
+_sessions_lock = threading.Lock()
+_etag_cache = {}  # url -> (ETag, decoded body) for conditional GETs in get_file_contents
+_etag_cache_lock = threading.Lock()
+
+def _get_session(token):
+    """
+    One keep-alive session per token, so back-to-back requests (e.g. the 5 in
+    commit_files) reuse the TLS connection to api.github.com.
+    Retry only covers idempotent verbs and 5xx; POST/PATCH are never replayed.
+    Rate limits (429/403) are left to GitHubService._request so its wait cap
+    applies, and an exhausted retry returns the last response instead of raising.
+    """
+    with _sessions_lock:
+        session = _sessions.get(token)
+        if session is None:
+            session = requests.Session()
+            session.headers.update({
+                "Authorization": f"Bearer {token}",
+                "Accept": "application/vnd.github+json"
+            })
+            session.mount("https://", HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=16,
+                max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504],
+                                  raise_on_status=False)
+            ))
+            _sessions[token] = session
+        return session
+
 class GitHubService:
     """
     Minimal interface for GitHub actions. Could commit JSON for session rollback if needed.
     """
 
     def __init__(self):
-        self.github_token = os.environ.get("GH_TOKEN")
+        self.github_token = GH_TOKEN
         if not self.github_token:
-            raise ValueError("GH_TOKEN not set.")
-        self.headers = {
-            "Authorization": f"Bearer {self.github_token}",
-            "Accept": "application/vnd.github+json"
-        }
-        self.default_owner = os.environ.get("GH_OWNER", "")
-        self.default_repo = os.environ.get("GH_REPO_NAME", "")
+            raise ValueError("GH_TOKEN (or GITHUB_TOKEN) not set.")
+        self.session = _get_session(self.github_token)
+        self.default_owner = GH_OWNER
+        self.default_repo = GH_REPO_NAME
+
+    def _request(self, method, url, **kwargs):
+        """
+        session.request that waits out GitHub rate limits instead of failing:
+        429 or a 403 with Retry-After / X-RateLimit-Remaining: 0 sleeps exactly as
+        long as GitHub asks (up to MAX_RATE_LIMIT_WAIT_SECONDS) and tries again.
+        A rate-limited request wasn't processed, so this is safe for POST/PATCH too.
+        Transient 5xx on idempotent verbs is retried by the session's adapter.
+        """
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            resp = self.session.request(method, url, **kwargs)
+            if resp.status_code not in (403, 429) or attempt == RATE_LIMIT_RETRIES:
+                return resp
+
+            retry_after = resp.headers.get("Retry-After")
+            if retry_after is not None:
+                try:
+                    delay = float(retry_after)
+                except (TypeError, ValueError):
+                    delay = 2 ** attempt  # an HTTP-date rather than seconds
+            elif resp.headers.get("X-RateLimit-Remaining") == "0":
+                delay = max(0.0, float(resp.headers.get("X-RateLimit-Reset", 0)) - time.time())
+            elif resp.status_code == 429:
+                delay = 2 ** attempt
+            else:
+                return resp  # an ordinary 403 (permissions), not a rate limit
+
+            if delay > MAX_RATE_LIMIT_WAIT_SECONDS:
+                logger.error("GitHub rate limit on %s %s resets in %ds, giving up", method, url, delay)
+                return resp
+            logger.warning("GitHub rate limited on %s %s, retrying in %.1fs", method, url, delay)
+            time.sleep(delay)
+
+    def _repo_url(self, owner, repo):
+        owner = owner or self.default_owner
+        repo = repo or self.default_repo
+        if owner == GH_OWNER and repo == GH_REPO_NAME:
+            return DEFAULT_REPO_URL
+        return f"{GITHUB_API_URL}/repos/{owner}/{repo}"
 
     def get_file_contents(self, owner=None, repo=None, path="README.md", ref="main"):
-        if not owner:
-            owner = self.default_owner
-        if not repo:
-            repo = self.default_repo
-        url = f"https://api.github.com/repos/{owner}/{repo}/contents/{path}?ref={ref}"
-        resp = requests.get(url, headers=self.headers)
+        url = f"{self._repo_url(owner, repo)}/contents/{path}?ref={ref}"
+        # Conditional GET: an unchanged file comes back as an empty 304, which
+        # doesn't count against the rate limit.
+        with _etag_cache_lock:
+            cached = _etag_cache.get(url)
+        headers = {"If-None-Match": cached[0]} if cached else None
+        resp = self._request("GET", url, headers=headers)
+        if resp.status_code == 304 and cached:
+            return cached[1]
         if resp.status_code == 200:
             data = resp.json()
-            return base64.b64decode(data.get("content", "")).decode("utf-8")
+            content = base64.b64decode(data.get("content", "")).decode("utf-8")
+            etag = resp.headers.get("ETag")
+            if etag:
+                with _etag_cache_lock:
+                    if len(_etag_cache) >= 256 and url not in _etag_cache:
+                        _etag_cache.pop(next(iter(_etag_cache)))
+                    _etag_cache[url] = (etag, content)
+            return content
         else:
-            logger.error(f"Failed to get file contents: {resp.text}")
+            logger.error("Failed to get file contents: %s", resp.text)
             return None
 
     def create_pull_request(self, owner=None, repo=None, head_branch="feature", base_branch="main",
                             title="New PR", body=""):
-        if not owner:
-            owner = self.default_owner
-        if not repo:
-            repo = self.default_repo
-
-        url = f"https://api.github.com/repos/{owner}/{repo}/pulls"
+        url = f"{self._repo_url(owner, repo)}/pulls"
         payload = {"title": title, "body": body, "head": head_branch, "base": base_branch}
-        resp = requests.post(url, headers=self.headers, json=payload)
+        resp = self._request("POST", url, json=payload)
         if resp.status_code in [200, 201]:
             return resp.json().get("html_url")
         else:
-            logger.error(f"Failed to create PR: {resp.text}")
+            logger.error("Failed to create PR: %s", resp.text)
+            return None
+
+    def commit_files(self, files, message, branch="main", owner=None, repo=None):
+        """
+        Commit several files to `branch` as a single commit through the Git Data API:
+        read the branch head, create one tree with all file contents inline, create
+        the commit, move the ref. That is 5 requests no matter how many files,
+        instead of a GET + PUT per file with the Contents API.
+        `files` maps repo path -> text content. Returns the new commit SHA or None.
+        """
+        base_url = f"{self._repo_url(owner, repo)}/git"
+
+        resp = self._request("GET", f"{base_url}/ref/heads/{branch}")
+        if resp.status_code != 200:
+            logger.error("Failed to read branch %s: %s", branch, resp.text)
+            return None
+        head_sha = resp.json()["object"]["sha"]
+
+        resp = self._request("GET", f"{base_url}/commits/{head_sha}")
+        if resp.status_code != 200:
+            logger.error("Failed to read commit %s: %s", head_sha, resp.text)
+            return None
+        base_tree_sha = resp.json()["tree"]["sha"]
+
+        tree = [
+            {"path": path, "mode": "100644", "type": "blob", "content": content}
+            for path, content in files.items()
+        ]
+        resp = self._request("POST", f"{base_url}/trees", json={"base_tree": base_tree_sha, "tree": tree})
+        if resp.status_code != 201:
+            logger.error("Failed to create tree: %s", resp.text)
+            return None
+        tree_sha = resp.json()["sha"]
+
+        resp = self._request("POST", f"{base_url}/commits",
+                             json={"message": message, "tree": tree_sha, "parents": [head_sha]})
+        if resp.status_code != 201:
+            logger.error("Failed to create commit: %s", resp.text)
+            return None
+        commit_sha = resp.json()["sha"]
+
+        resp = self._request("PATCH", f"{base_url}/refs/heads/{branch}", json={"sha": commit_sha})
+        if resp.status_code != 200:
+            logger.error("Failed to update branch %s: %s", branch, resp.text)
             return None
+        return commit_sha
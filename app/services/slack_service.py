@@ -1,14 +1,84 @@
 # project_root/services/slack_service.py
 
 import os
+import json
 import logging
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from flask import request, jsonify
 from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+from slack_sdk.http_retry.builtin_handlers import ConnectionErrorRetryHandler, RateLimitErrorRetryHandler
 from slack_sdk.signature import SignatureVerifier
 
 logger = logging.getLogger(__name__)
 
-processed_event_ids = set()  # simple in-memory store. Could reset on restarts.
+# Read once at import.
+SLACK_BOT_TOKEN = os.environ.get("SLACK_BOT_TOKEN", "")
+SLACK_SIGNING_SECRET = os.environ.get("SLACK_SIGNING_SECRET", "")
+# The Slack bot's user ID (e.g. "U089Q3FGMKQ").
+# Typically set via environment or found from Slack (whoami).
+BOT_USER_ID = os.environ.get("BOT_USER_ID", "")
+
+# event_id -> time.monotonic() when first seen, oldest first. Slack retries an
+# event for at most about an hour, so older IDs are dropped (as is the oldest
+# one past the size cap) to keep memory bounded. Resets on restarts.
+processed_event_ids = OrderedDict()
+_processed_event_ids_lock = threading.Lock()
+PROCESSED_EVENT_TTL_SECONDS = 3600
+PROCESSED_EVENT_MAX_IDS = 10000
+
+def _claim_event_id(event_id):
+    """
+    Atomically record event_id. Returns False if it was already seen, so
+    concurrent Slack retries of the same event can't both get processed.
+    """
+    now = time.monotonic()
+    with _processed_event_ids_lock:
+        while processed_event_ids:
+            oldest_id, seen_at = next(iter(processed_event_ids.items()))
+            if now - seen_at <= PROCESSED_EVENT_TTL_SECONDS and len(processed_event_ids) < PROCESSED_EVENT_MAX_IDS:
+                break
+            processed_event_ids.popitem(last=False)
+
+        if event_id in processed_event_ids:
+            return False
+        processed_event_ids[event_id] = now
+        return True
+
+# One WebClient for the whole process. BotEngine, the modules and generated
+# snippets each build their own SlackService; they all share this client and
+# its retry handlers instead of configuring one apiece.
+_shared_web_client = None
+_shared_web_client_lock = threading.Lock()
+
+def _get_web_client():
+    global _shared_web_client
+    if _shared_web_client is None:
+        with _shared_web_client_lock:
+            if _shared_web_client is None:
+                # Retry dropped connections and 429s (honoring Retry-After) in the
+                # client, so a burst of chat_update edits from a streamed answer
+                # or a stale keep-alive socket doesn't lose the message.
+                _shared_web_client = WebClient(
+                    token=SLACK_BOT_TOKEN,
+                    retry_handlers=[
+                        ConnectionErrorRetryHandler(max_retry_count=2),
+                        RateLimitErrorRetryHandler(max_retry_count=2),
+                    ]
+                )
+    return _shared_web_client
+
+_signature_verifier = SignatureVerifier(SLACK_SIGNING_SECRET)
+
+# Runs bot_engine work for acked events. Bounded, so a burst of mentions queues
+# up instead of spawning a thread apiece, and worker threads are reused.
+_event_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("SLACK_EVENT_WORKERS", "32")),
+    thread_name_prefix="slack-evt"
+)
 
 class SlackService:
     """
@@ -17,38 +87,44 @@ class SlackService:
 
     def __init__(self, bot_engine=None):
         self.bot_engine = bot_engine
-        self.signing_secret = os.environ.get("SLACK_SIGNING_SECRET", "")
-        self.signature_verifier = SignatureVerifier(self.signing_secret)
-        self.web_client = WebClient(token=os.environ.get("SLACK_BOT_TOKEN", ""))
-
-        # The Slack bot's user ID (e.g. "U089Q3FGMKQ"). 
-        # Typically set via environment or found from Slack (whoami).
-        self.bot_user_id = os.environ.get("BOT_USER_ID", "")
+        self.signing_secret = SLACK_SIGNING_SECRET
+        self.signature_verifier = _signature_verifier
+        self.web_client = _get_web_client()
+        self.bot_user_id = BOT_USER_ID
 
     def register_routes(self, app):
         @app.route("/slack/events", methods=["POST"])
         def slack_events():
-            if "challenge" in request.json:
-                return jsonify({"challenge": request.json["challenge"]}), 200
+            # Read and parse the body once; the raw bytes are what gets signed.
+            raw_body = request.get_data(cache=True)
+            try:
+                payload = json.loads(raw_body)
+            except ValueError:
+                return "Invalid JSON body", 400
 
-            if not self._is_request_valid(request):
+            if "challenge" in payload:
+                return jsonify({"challenge": payload["challenge"]}), 200
+
+            if not self._is_request_valid(raw_body, request.headers):
                 return "Invalid request signature", 401
 
             # Respond quickly so Slack doesn't retry
             resp = {"status": "ok"}
 
-            event_data = request.json.get("event", {})
-            event_id = request.json.get("event_id")
+            event_data = payload.get("event", {})
+            event_id = payload.get("event_id")
             event_type = event_data.get("type", "")
             user_id = event_data.get("user", "")
             bot_id = event_data.get("bot_id")
 
-            # 1) Skip duplicates
-            if event_id and event_id in processed_event_ids:
-                logger.debug("Skipping duplicate event_id=%s", event_id)
+            # 1) Skip duplicates. Retries (X-Slack-Retry-Num) go through the same
+            #    event_id claim: if this process already queued the event the retry
+            #    is dropped, but after a restart the retry is the only delivery left.
+            if event_id and not _claim_event_id(event_id):
+                logger.debug("Skipping duplicate event_id=%s (retry #%s, reason=%s)", event_id,
+                             request.headers.get("X-Slack-Retry-Num"),
+                             request.headers.get("X-Slack-Retry-Reason"))
                 return jsonify(resp), 200
-            if event_id:
-                processed_event_ids.add(event_id)
 
             # 2) Skip if from the bot itself
             if bot_id is not None:
@@ -61,7 +137,7 @@ class SlackService:
             # 3) Distinguish app_mention vs. message
             if event_type == "app_mention":
                 # The user explicitly tagged the bot => handle in bot_engine
-                self.bot_engine.handle_incoming_slack_event(event_data)
+                self._dispatch_in_background(event_data)
 
             elif event_type == "message":
                 # Possibly typed snippet commands, or snippet is pending
@@ -69,27 +145,52 @@ class SlackService:
                 thread_ts  = event_data.get("thread_ts") or event_data.get("ts")
 
                 # If there's a snippet pending in that thread, 
-                # we let bot_engine handle typed commands or confirm/cancel/extend
-                if self.bot_engine.has_pending_snippet(channel_id, thread_ts):
-                    self.bot_engine.handle_incoming_slack_event(event_data)
+                # we let bot_engine handle typed commands or confirm/cancel/extend.
+                # Sniff the text first so ordinary chatter skips the pending-snippet lookup.
+                if (self.bot_engine.is_snippet_command(event_data.get("text", ""))
+                        and self.bot_engine.has_pending_snippet(channel_id, thread_ts)):
+                    self._dispatch_in_background(event_data)
                 # else do nothing for normal messages (no mention, no snippet pending)
 
             return jsonify(resp), 200
 
-    def _is_request_valid(self, req):
-        timestamp = req.headers.get("X-Slack-Request-Timestamp", "")
-        signature = req.headers.get("X-Slack-Signature", "")
-        body = req.get_data(as_text=True)
-        return self.signature_verifier.is_valid(body, timestamp, signature)
+    def _dispatch_in_background(self, event_data):
+        """
+        Hand the event to bot_engine on the shared executor so this request can
+        ack right away. GPT/GitHub work easily exceeds Slack's 3-second ack
+        window, and a late ack makes Slack retry the event.
+        """
+        _event_executor.submit(self._handle_event, event_data)
+
+    def _handle_event(self, event_data):
+        try:
+            self.bot_engine.handle_incoming_slack_event(event_data)
+        except Exception as e:
+            logger.error("SlackService event handling error: %s", e, exc_info=True)
+
+    def _is_request_valid(self, body, headers):
+        # Verify the exact bytes Slack signed, as read off the wire; never text
+        # re-serialized from the parsed payload, which needn't match byte for byte.
+        return self.signature_verifier.is_valid_request(body, dict(headers))
 
     def post_message(self, channel, text, thread_ts=None):
+        """
+        Post a message; returns its ts (for update_message) or None on failure.
+        """
+        try:
+            resp = self.web_client.chat_postMessage(channel=channel, text=text, thread_ts=thread_ts)
+            return resp.get("ts")
+        except Exception as e:
+            logger.error("SlackService post_message error: %s", e)
+            return None
+
+    def update_message(self, channel, ts, text):
         try:
-            self.web_client.chat_postMessage(channel=channel, text=text, thread_ts=thread_ts)
+            self.web_client.chat_update(channel=channel, ts=ts, text=text)
         except Exception as e:
-            logger.error(f"SlackService post_message error: {e}")
+            logger.error("SlackService update_message error: %s", e)
 
     def remove_self_from_channel(self, channel_id):
-        from slack_sdk.errors import SlackApiError
         try:
             resp = self.web_client.conversations_leave(channel=channel_id)
             if not resp.get("ok", False):